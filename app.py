@@ -6,8 +6,9 @@
 import streamlit as st
 import pandas as pd
 import numpy as np
-from shop_analyzer import ShopAnalyzer
-import plotly.express as px
+import hashlib
+import html
+from shop_analyzer import ShopAnalyzer, read_excel, write_excel_sheets
 import plotly.graph_objects as go
 from io import BytesIO
 from datetime import datetime
@@ -44,50 +45,85 @@ st.markdown("""
 </style>
 """, unsafe_allow_html=True)
 
-def load_data_from_upload(uploaded_file):
-    """从上传的文件加载数据"""
+# DataFrame的哈希方式：按内容逐行哈希，供缓存函数识别相同数据
+_DF_HASH_FUNCS = {pd.DataFrame: lambda d: pd.util.hash_pandas_object(d, index=True).values.tobytes()}
+
+def file_digest(file_bytes):
+    """上传文件内容的摘要，作为各级缓存的键（每次交互只计算一次）"""
+    return hashlib.blake2b(file_bytes, digest_size=16).hexdigest()
+
+@st.cache_data(show_spinner=False)
+def _load_excel(digest, _file_bytes):
+    """解析Excel字节流（按文件摘要缓存，文件内容本身不参与哈希）"""
+    return read_excel(BytesIO(_file_bytes))
+
+def load_data_from_upload(uploaded_file, digest, file_bytes):
+    """从上传的文件加载数据（digest为file_bytes的摘要，由调用方计算一次）"""
     try:
         if uploaded_file.name.endswith('.xlsx') or uploaded_file.name.endswith('.xls'):
-            df = pd.read_excel(uploaded_file)
+            df = _load_excel(digest, file_bytes)
             return df, None
         else:
             return None, "请上传Excel文件（.xlsx或.xls格式）"
     except Exception as e:
         return None, f"加载文件失败: {str(e)}"
 
+def get_session_analyzer(uploaded_file, slot):
+    """
+    获取上传文件的摘要、数据和分析器
+    
+    按文件内容保存在会话中，文件不变时界面交互直接复用同一个分析器
+    （及其缓存的分析结果），不再重新解析和分析。slot不能与控件的key
+    重名，否则会读到控件自身的值
+    """
+    file_bytes = uploaded_file.getvalue()
+    digest = file_digest(file_bytes)
+    cached = st.session_state.get(slot)
+    if cached is None or cached[0] != digest:
+        df, error = load_data_from_upload(uploaded_file, digest, file_bytes)
+        if error:
+            return None, None, None, error
+        # 浅拷贝：分析器会添加辅助列，不影响数据预览
+        cached = (digest, df, ShopAnalyzer(df=df.copy(deep=False)))
+        st.session_state[slot] = cached
+    return cached[0], cached[1], cached[2], None
+
+def _number_column_config(df):
+    """表格中的小数列统一显示两位小数"""
+    return {col: st.column_config.NumberColumn(format='%.2f') for col in df.select_dtypes('float').columns}
+
+@st.cache_data(show_spinner=False, hash_funcs=_DF_HASH_FUNCS)
 def create_chart_product_performance(df, chart_type='bar'):
-    """创建产品业绩图表"""
+    """创建产品业绩图表（按数据缓存，返回图表字典）"""
     if df is None or len(df) == 0:
         return None
     
-    # 取前10名
-    df_top = df.head(10).copy()
-    df_top = df_top.reset_index()
-    
     if '销售额' in df.columns:
+        # 取前10名
+        df_top = df.head(10)
+        names = df_top.index.to_numpy()
+        sales = df_top['销售额'].to_numpy()
+        
         if chart_type == 'bar':
-            fig = px.bar(
-                df_top,
-                x=df_top.columns[0],
-                y='销售额',
-                title='产品销售额TOP 10',
-                labels={df_top.columns[0]: '产品', '销售额': '销售额（元）'},
-                color='销售额',
-                color_continuous_scale='Blues'
-            )
+            fig = go.Figure(go.Bar(
+                x=names,
+                y=sales,
+                marker=dict(color=sales, colorscale='Blues', showscale=True,
+                            colorbar=dict(title='销售额（元）')),
+                hovertemplate='产品=%{x}<br>销售额（元）=%{y}<extra></extra>',
+                showlegend=False
+            ))
+            fig.update_layout(title='产品销售额TOP 10', xaxis_title='产品', yaxis_title='销售额（元）')
         else:
-            fig = px.pie(
-                df_top,
-                values='销售额',
-                names=df_top.columns[0],
-                title='产品销售额占比TOP 10'
-            )
+            fig = go.Figure(go.Pie(labels=names, values=sales))
+            fig.update_layout(title='产品销售额占比TOP 10')
         fig.update_layout(height=400, showlegend=True)
-        return fig
+        return fig.to_dict()
     return None
 
+@st.cache_data(show_spinner=False, hash_funcs=_DF_HASH_FUNCS)
 def create_comparison_chart(comparison_df):
-    """创建对比图表"""
+    """创建对比图表（按数据缓存，返回图表字典）"""
     if comparison_df is None or len(comparison_df) == 0:
         return None
     
@@ -96,26 +132,29 @@ def create_comparison_chart(comparison_df):
     
     # 取变化最大的前10个产品
     df_sorted = comparison_df.sort_values('销售额变化', ascending=False)
-    df_top = df_sorted.head(10).copy()
+    df_top = df_sorted.head(10)
     
     fig = go.Figure()
     
+    names = df_top['产品'].to_numpy()
+    changes = df_top['销售额变化'].to_numpy()
+    growth = changes > 0
+    decline = changes < 0
+    
     # 添加增长的产品（绿色）
-    growth = df_top[df_top['销售额变化'] > 0]
-    if len(growth) > 0:
+    if growth.any():
         fig.add_trace(go.Bar(
-            x=growth['产品'],
-            y=growth['销售额变化'],
+            x=names[growth],
+            y=changes[growth],
             name='增长',
             marker_color='green'
         ))
     
     # 添加下降的产品（红色）
-    decline = df_top[df_top['销售额变化'] < 0]
-    if len(decline) > 0:
+    if decline.any():
         fig.add_trace(go.Bar(
-            x=decline['产品'],
-            y=decline['销售额变化'],
+            x=names[decline],
+            y=changes[decline],
             name='下降',
             marker_color='red'
         ))
@@ -128,29 +167,148 @@ def create_comparison_chart(comparison_df):
         barmode='group'
     )
     
-    return fig
+    return fig.to_dict()
 
-def export_to_excel_bytes(analyzer, comparison_df=None):
-    """导出分析结果到Excel字节流"""
+@st.cache_data(show_spinner=False)
+def export_to_excel_bytes(cache_key, _product_perf, _product_size_perf, _comparison_df=None):
+    """
+    导出分析结果到Excel字节流
+    
+    cache_key为上传文件的摘要（对比时为两个摘要），分析结果由文件内容
+    唯一确定，不再逐行哈希DataFrame
+    """
     output = BytesIO()
+    sheets = {}
+    
+    # 产品业绩
+    if _product_perf is not None:
+        sheets['产品业绩'] = _product_perf.reset_index()
+    
+    # 产品+尺寸业绩
+    if _product_size_perf is not None:
+        sheets['产品尺寸业绩'] = _product_size_perf.reset_index()
     
-    with pd.ExcelWriter(output, engine='openpyxl') as writer:
-        # 产品业绩
-        product_perf = analyzer.analyze_product_performance('product')
-        if product_perf is not None:
-            product_perf.to_excel(writer, sheet_name='产品业绩', index=True)
+    # 对比分析
+    if _comparison_df is not None:
+        sheets['月度对比'] = _comparison_df
+    
+    write_excel_sheets(output, sheets)
+    return output.getvalue()
+
+def _column_values(df, col):
+    """取列的numpy数组，列不存在时返回全0"""
+    if col in df.columns:
+        return df[col].to_numpy()
+    return np.zeros(len(df))
+
+def top_sales_markdown(perf_df, n):
+    """销售额TOP N列表，拼成一段Markdown一次输出"""
+    top = perf_df.head(n)
+    rows = zip(top.index.to_numpy(), _column_values(top, '销售额'), _column_values(top, '销售额占比(%)'))
+    lines = [f"{idx}. **{item}**: ¥{sales:,.2f} ({ratio:.2f}%)" for idx, (item, sales, ratio) in enumerate(rows, 1)]
+    return "\n".join(lines)
+
+def render_product_tab(product_perf):
+    """产品业绩标签页"""
+    st.subheader("产品业绩分析")
+    
+    if product_perf is not None:
+        # 显示关键指标
+        col1, col2, col3, col4 = st.columns(4)
+        with col1:
+            if '销售额' in product_perf.columns:
+                total_sales = product_perf['销售额'].sum()
+                st.metric("总销售额", f"¥{total_sales:,.2f}")
+        with col2:
+            if '销量' in product_perf.columns:
+                total_qty = product_perf['销量'].sum()
+                st.metric("总销量", f"{total_qty:,.0f}")
+        with col3:
+            if '销售额' in product_perf.columns:
+                top_product = product_perf.index[0]
+                st.metric("销售额最高", top_product)
+        with col4:
+            if '销售额占比(%)' in product_perf.columns:
+                top_ratio = product_perf['销售额占比(%)'].iloc[0]
+                st.metric("最高占比", f"{top_ratio:.2f}%")
         
-        # 产品+尺寸业绩
-        product_size_perf = analyzer.analyze_product_performance('product_size')
-        if product_size_perf is not None:
-            product_size_perf.to_excel(writer, sheet_name='产品尺寸业绩', index=True)
+        # 显示数据表
+        st.dataframe(product_perf, use_container_width=True, column_config=_number_column_config(product_perf))
         
-        # 对比分析
-        if comparison_df is not None:
-            comparison_df.to_excel(writer, sheet_name='月度对比', index=False)
+        # 显示TOP 5
+        st.subheader("销售额TOP 5")
+        st.markdown(top_sales_markdown(product_perf, 5))
+    else:
+        st.warning("⚠ 无法进行产品业绩分析，请检查数据格式")
+
+def render_product_size_tab(product_size_perf):
+    """产品+尺寸业绩标签页"""
+    st.subheader("产品+尺寸业绩分析")
     
-    output.seek(0)
-    return output
+    if product_size_perf is not None:
+        st.dataframe(product_size_perf, use_container_width=True, column_config=_number_column_config(product_size_perf))
+        
+        # 显示TOP 10
+        st.subheader("销售额TOP 10")
+        st.markdown(top_sales_markdown(product_size_perf, 10))
+    else:
+        st.warning("⚠ 无法进行产品+尺寸业绩分析")
+
+@st.fragment
+def render_chart_tab(product_perf):
+    """数据可视化标签页（独立重跑：切换图表类型时只刷新本标签页）"""
+    st.subheader("数据可视化")
+    
+    if product_perf is not None:
+        col1, col2 = st.columns(2)
+        
+        with col1:
+            chart_type = st.selectbox("选择图表类型", ["柱状图", "饼图"])
+            chart = create_chart_product_performance(
+                product_perf,
+                'pie' if chart_type == "饼图" else 'bar'
+            )
+            if chart:
+                st.plotly_chart(chart, use_container_width=True)
+        
+        with col2:
+            st.subheader("销售额分布")
+            if '销售额占比(%)' in product_perf.columns:
+                # 显示占比信息（三个进度条一次输出）
+                top3 = product_perf.head(3)
+                bars = []
+                for product, ratio in zip(top3.index.to_numpy(), top3['销售额占比(%)'].to_numpy()):
+                    bars.append(f'<div>{html.escape(str(product))}: {ratio:.2f}%</div>'
+                                f'<progress value="{ratio:.2f}" max="100" style="width: 100%;"></progress>')
+                st.markdown(''.join(bars), unsafe_allow_html=True)
+
+@st.fragment
+def render_download_section(cache_key, filename_prefix, product_perf, product_size_perf, comparison_df=None):
+    """
+    Excel报告下载区域（独立重跑，不触发整页重新计算）
+    
+    点击生成按钮后才生成工作簿，结果按文件摘要保存在会话中；
+    上传的文件变化后需重新生成
+    """
+    state_key = f"excel_report_{filename_prefix}"
+    report = st.session_state.get(state_key)
+    if report is None or report[0] != cache_key:
+        if not st.button("📄 生成Excel报告", key=f"{state_key}_build"):
+            return
+        with st.spinner("正在生成Excel报告..."):
+            excel_bytes = export_to_excel_bytes(cache_key, product_perf, product_size_perf, comparison_df)
+        report = (cache_key, excel_bytes)
+        st.session_state[state_key] = report
+    excel_bytes = report[1]
+    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+    filename = f"{filename_prefix}_{timestamp}.xlsx"
+    
+    st.download_button(
+        label="📥 下载Excel报告",
+        data=excel_bytes,
+        file_name=filename,
+        mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+    )
 
 def main():
     """主函数"""
@@ -198,7 +356,7 @@ def main():
         
         if uploaded_file is not None:
             # 加载数据
-            df, error = load_data_from_upload(uploaded_file)
+            digest, df, analyzer, error = get_session_analyzer(uploaded_file, 'analyzer_single')
             
             if error:
                 st.error(error)
@@ -210,111 +368,33 @@ def main():
                     st.dataframe(df.head(20), use_container_width=True)
                     st.caption(f"列名: {', '.join(df.columns.tolist())}")
                 
-                # 创建分析器
                 try:
-                    analyzer = ShopAnalyzer(df=df)
-                    
-                    # 显示检测到的列名
+                    # 显示检测到的列名（分析器初始化时已识别，不再重新匹配）
                     col_map = analyzer.detect_columns()
                     if col_map:
                         st.info(f"✓ 自动识别列名: {col_map}")
                     
+                    # 分析结果（分析器内缓存，各标签页共用）
+                    results = analyzer.analyze_many(('product', 'product_size'))
+                    product_perf = results['product']
+                    product_size_perf = results['product_size']
+                    
                     # 分析结果标签页
                     tab1, tab2, tab3, tab4 = st.tabs(["📈 产品业绩", "📦 产品+尺寸", "📊 数据可视化", "💾 下载报告"])
                     
                     with tab1:
-                        st.subheader("产品业绩分析")
-                        product_perf = analyzer.analyze_product_performance('product')
-                        
-                        if product_perf is not None:
-                            # 显示关键指标
-                            col1, col2, col3, col4 = st.columns(4)
-                            with col1:
-                                if '销售额' in product_perf.columns:
-                                    total_sales = product_perf['销售额'].sum()
-                                    st.metric("总销售额", f"¥{total_sales:,.2f}")
-                            with col2:
-                                if '销量' in product_perf.columns:
-                                    total_qty = product_perf['销量'].sum()
-                                    st.metric("总销量", f"{total_qty:,.0f}")
-                            with col3:
-                                if '销售额' in product_perf.columns:
-                                    top_product = product_perf.index[0]
-                                    st.metric("销售额最高", top_product)
-                            with col4:
-                                if '销售额占比(%)' in product_perf.columns:
-                                    top_ratio = product_perf['销售额占比(%)'].iloc[0]
-                                    st.metric("最高占比", f"{top_ratio:.2f}%")
-                            
-                            # 显示数据表
-                            st.dataframe(product_perf, use_container_width=True)
-                            
-                            # 显示TOP 5
-                            st.subheader("销售额TOP 5")
-                            top5 = product_perf.head(5)
-                            for idx, (product, row) in enumerate(top5.iterrows(), 1):
-                                sales = row.get('销售额', 0)
-                                ratio = row.get('销售额占比(%)', 0)
-                                st.write(f"{idx}. **{product}**: ¥{sales:,.2f} ({ratio:.2f}%)")
-                        else:
-                            st.warning("⚠ 无法进行产品业绩分析，请检查数据格式")
+                        render_product_tab(product_perf)
                     
                     with tab2:
-                        st.subheader("产品+尺寸业绩分析")
-                        product_size_perf = analyzer.analyze_product_performance('product_size')
-                        
-                        if product_size_perf is not None:
-                            st.dataframe(product_size_perf, use_container_width=True)
-                            
-                            # 显示TOP 10
-                            st.subheader("销售额TOP 10")
-                            top10 = product_size_perf.head(10)
-                            for idx, (item, row) in enumerate(top10.iterrows(), 1):
-                                sales = row.get('销售额', 0)
-                                ratio = row.get('销售额占比(%)', 0)
-                                st.write(f"{idx}. **{item}**: ¥{sales:,.2f} ({ratio:.2f}%)")
-                        else:
-                            st.warning("⚠ 无法进行产品+尺寸业绩分析")
+                        render_product_size_tab(product_size_perf)
                     
                     with tab3:
-                        st.subheader("数据可视化")
-                        product_perf = analyzer.analyze_product_performance('product')
-                        
-                        if product_perf is not None:
-                            col1, col2 = st.columns(2)
-                            
-                            with col1:
-                                chart_type = st.selectbox("选择图表类型", ["柱状图", "饼图"])
-                                chart = create_chart_product_performance(
-                                    product_perf,
-                                    'pie' if chart_type == "饼图" else 'bar'
-                                )
-                                if chart:
-                                    st.plotly_chart(chart, use_container_width=True)
-                            
-                            with col2:
-                                st.subheader("销售额分布")
-                                if '销售额占比(%)' in product_perf.columns:
-                                    # 显示占比信息
-                                    top3 = product_perf.head(3)
-                                    for idx, (product, row) in enumerate(top3.iterrows(), 1):
-                                        ratio = row.get('销售额占比(%)', 0)
-                                        st.progress(ratio / 100, text=f"{product}: {ratio:.2f}%")
+                        render_chart_tab(product_perf)
                     
                     with tab4:
                         st.subheader("下载分析报告")
                         st.write("点击下方按钮下载完整的分析报告（Excel格式）")
-                        
-                        excel_bytes = export_to_excel_bytes(analyzer)
-                        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-                        filename = f"店铺业绩分析_{timestamp}.xlsx"
-                        
-                        st.download_button(
-                            label="📥 下载Excel报告",
-                            data=excel_bytes,
-                            file_name=filename,
-                            mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
-                        )
+                        render_download_section(digest, "店铺业绩分析", product_perf, product_size_perf)
                 
                 except Exception as e:
                     st.error(f"分析过程中出现错误: {str(e)}")
@@ -343,8 +423,8 @@ def main():
         
         if month1_file is not None and month2_file is not None:
             # 加载两个文件
-            df1, error1 = load_data_from_upload(month1_file)
-            df2, error2 = load_data_from_upload(month2_file)
+            digest1, df1, analyzer1, error1 = get_session_analyzer(month1_file, 'analyzer_month1')
+            digest2, df2, analyzer2, error2 = get_session_analyzer(month2_file, 'analyzer_month2')
             
             if error1:
                 st.error(f"上月文件错误: {error1}")
@@ -354,21 +434,21 @@ def main():
                 st.success(f"✓ 上月数据: {len(df1)} 行 | 本月数据: {len(df2)} 行")
                 
                 try:
-                    # 创建分析器
-                    analyzer1 = ShopAnalyzer(df=df1)
-                    analyzer2 = ShopAnalyzer(df=df2)
-                    
                     # 对比分析
-                    comparison = analyzer1.compare_months(df1, df2)
+                    comparison = analyzer1.compare_months(analyzer2)
                     
                     if comparison is not None:
                         # 关键指标
                         col1, col2, col3, col4 = st.columns(4)
                         
                         if '销售额变化' in comparison.columns:
+                            # 增长/下降只划分一次，指标和标签页共用
+                            changes = comparison['销售额变化'].to_numpy()
+                            growth_mask = changes > 0
+                            decline_mask = changes < 0
                             total_change = comparison['销售额变化'].sum()
-                            growth_count = len(comparison[comparison['销售额变化'] > 0])
-                            decline_count = len(comparison[comparison['销售额变化'] < 0])
+                            growth_count = int(growth_mask.sum())
+                            decline_count = int(decline_mask.sum())
                             
                             with col1:
                                 st.metric("总销售额变化", f"¥{total_change:,.2f}")
@@ -386,7 +466,7 @@ def main():
                         
                         with tab1:
                             st.subheader("完整对比结果")
-                            st.dataframe(comparison, use_container_width=True)
+                            st.dataframe(comparison, use_container_width=True, column_config=_number_column_config(comparison))
                             
                             # 可视化
                             chart = create_comparison_chart(comparison)
@@ -395,55 +475,54 @@ def main():
                         
                         with tab2:
                             st.subheader("增长的产品")
-                            if '销售额变化率(%)' in comparison.columns:
-                                growth = comparison[comparison['销售额变化率(%)'] > 0].copy()
+                            if '销售额变化' in comparison.columns:
+                                growth = comparison.iloc[np.flatnonzero(growth_mask)]
                                 growth = growth.sort_values('销售额变化率(%)', ascending=False)
                                 
                                 if len(growth) > 0:
-                                    st.dataframe(growth, use_container_width=True)
+                                    st.dataframe(growth, use_container_width=True, column_config=_number_column_config(growth))
                                     
                                     # 显示增长TOP 5
                                     st.subheader("增长TOP 5")
                                     top5_growth = growth.head(5)
-                                    for idx, row in top5_growth.iterrows():
-                                        product = row['产品']
-                                        change = row.get('销售额变化', 0)
-                                        change_rate = row.get('销售额变化率(%)', 0)
-                                        st.success(f"**{product}**: +¥{change:,.2f} (+{change_rate:.2f}%)")
+                                    lines = []
+                                    for product, change, change_rate in zip(top5_growth['产品'].to_numpy(),
+                                                                            top5_growth['销售额变化'].to_numpy(),
+                                                                            _column_values(top5_growth, '销售额变化率(%)')):
+                                        lines.append(f"**{product}**: +¥{change:,.2f} (+{change_rate:.2f}%)")
+                                    st.success("  \n".join(lines))
                                 else:
                                     st.info("本月没有增长的产品")
                         
                         with tab3:
                             st.subheader("下降的产品")
-                            if '销售额变化率(%)' in comparison.columns:
-                                decline = comparison[comparison['销售额变化率(%)'] < 0].copy()
+                            if '销售额变化' in comparison.columns:
+                                decline = comparison.iloc[np.flatnonzero(decline_mask)]
                                 decline = decline.sort_values('销售额变化率(%)')
                                 
                                 if len(decline) > 0:
-                                    st.dataframe(decline, use_container_width=True)
+                                    st.dataframe(decline, use_container_width=True, column_config=_number_column_config(decline))
                                     
                                     # 显示下降TOP 5
                                     st.subheader("下降TOP 5")
                                     top5_decline = decline.head(5)
-                                    for idx, row in top5_decline.iterrows():
-                                        product = row['产品']
-                                        change = row.get('销售额变化', 0)
-                                        change_rate = row.get('销售额变化率(%)', 0)
-                                        st.error(f"**{product}**: ¥{change:,.2f} ({change_rate:.2f}%)")
+                                    lines = []
+                                    for product, change, change_rate in zip(top5_decline['产品'].to_numpy(),
+                                                                            top5_decline['销售额变化'].to_numpy(),
+                                                                            _column_values(top5_decline, '销售额变化率(%)')):
+                                        lines.append(f"**{product}**: ¥{change:,.2f} ({change_rate:.2f}%)")
+                                    st.error("  \n".join(lines))
                                 else:
                                     st.success("✓ 本月没有下降的产品")
                         
                         with tab4:
                             st.subheader("下载对比报告")
-                            excel_bytes = export_to_excel_bytes(analyzer1, comparison)
-                            timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-                            filename = f"月度对比分析_{timestamp}.xlsx"
-                            
-                            st.download_button(
-                                label="📥 下载Excel报告",
-                                data=excel_bytes,
-                                file_name=filename,
-                                mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+                            render_download_section(
+                                (digest1, digest2),
+                                "月度对比分析",
+                                analyzer1.analyze_product_performance('product'),
+                                analyzer1.analyze_product_performance('product_size'),
+                                comparison
                             )
                     else:
                         st.warning("⚠ 对比分析失败，请检查数据格式")
@@ -6,16 +6,192 @@
 
 import pandas as pd
 import numpy as np
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from importlib.util import find_spec
+from functools import lru_cache
 from pathlib import Path
 import sys
 from datetime import datetime
 import warnings
 warnings.filterwarnings('ignore')
 
+try:
+    # 可选依赖：Rust实现的Excel写入器，比xlsxwriter快数倍
+    from rustpy_xlsxwriter import FastExcel
+except ImportError:
+    FastExcel = None
+
+
+try:
+    # 可选依赖：Arrow类型存储与字符串计算
+    import pyarrow as pa
+    import pyarrow.compute as pc
+except ImportError:
+    pa = None
+
+# 可选依赖：Rust实现的calamine解析引擎
+_HAS_CALAMINE = find_spec('python_calamine') is not None
+
+# 可选依赖：对比指标的JIT编译计算（导入较慢，首次对比时才导入）
+_HAS_NUMBA = find_spec('numba') is not None
+
+
+def read_excel(source, **kwargs):
+    """
+    读取Excel文件
+    
+    已安装python-calamine时使用calamine引擎解析，已安装pyarrow时
+    数据以Arrow类型存储（字符串列更省内存，分组更快）；数值列混有文字
+    导致Arrow类型转换失败时，改用默认类型重新读取
+    
+    Parameters:
+    -----------
+    source : str, Path 或 BytesIO
+        Excel文件路径或字节流
+    **kwargs
+        其余参数传给 pd.read_excel
+    """
+    if _HAS_CALAMINE:
+        kwargs.setdefault('engine', 'calamine')
+    if pa is None or 'dtype_backend' in kwargs:
+        return pd.read_excel(source, **kwargs)
+    try:
+        return pd.read_excel(source, dtype_backend='pyarrow', **kwargs)
+    except ValueError:
+        # 数值列中混有文字（如运费写"包邮"、数量写"-"）时Arrow类型转换失败，
+        # 改用默认类型读取，由分析器统一转换为数值
+        if hasattr(source, 'seek'):
+            source.seek(0)
+        return pd.read_excel(source, **kwargs)
+
+
+def _format_number(value):
+    """数值显示为两位小数"""
+    return f"{value:.2f}"
+
+
+def _join_keys(left, right, sep='_'):
+    """按行拼接两列，返回分类类型的组合键"""
+    if pa is not None:
+        string = pa.large_string()
+        joined = pc.binary_join_element_wise(pa.array(left.astype(str), type=string),
+                                             pa.array(right.astype(str), type=string),
+                                             pa.scalar(sep, type=string))
+        values = joined.to_numpy(zero_copy_only=False)
+    else:
+        values = left.astype(str).values + sep + right.astype(str).values
+    codes, categories = pd.factorize(values)
+    return pd.Categorical.from_codes(codes, categories)
+
+
+def _change_and_rate_loop(prev, curr, change, rate):
+    """计算变化量和变化率(%)并写入change、rate，基数为0时变化率为NaN（供numba编译）"""
+    for i in range(prev.shape[0]):
+        d = curr[i] - prev[i]
+        change[i] = d
+        rate[i] = d / prev[i] * 100.0 if prev[i] != 0 else np.nan
+
+
+def _change_and_rate_numpy(prev, curr, change, rate):
+    """计算变化量和变化率(%)并写入change、rate，基数为0时变化率为NaN"""
+    np.subtract(curr, prev, out=change)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        np.divide(change, prev, out=rate)
+    rate *= 100.0
+    rate[prev == 0] = np.nan
+
+
+@lru_cache(maxsize=None)
+def _change_kernel():
+    """首次调用时导入numba并编译，未安装时使用numpy实现"""
+    if not _HAS_NUMBA:
+        return _change_and_rate_numpy
+    from numba import njit
+    # 不使用parallel：Streamlit在工作线程中执行脚本，numba的并行线程层
+    # 在非主线程首次调用时可能卡死；产品数量级的数组串行循环已足够快
+    return njit(cache=True)(_change_and_rate_loop)
+
+
+def _change_and_rate(prev, curr, change, rate):
+    """计算变化量和变化率(%)并写入change、rate，基数为0时变化率为NaN"""
+    _change_kernel()(prev, curr, change, rate)
+
+
+# Excel列数字格式：金额、数量、小数（占比和变化率为0-100的百分数值，不用%格式）
+_EXCEL_NUM_FORMATS = {
+    'money': '¥#,##0.00',
+    'integer': '#,##0',
+    'decimal': '0.00',
+}
+
+
+def _excel_format_key(name, values):
+    """按列名和类型确定Excel数字格式，非数值列返回None"""
+    if not pd.api.types.is_numeric_dtype(values):
+        return None
+    name = str(name)
+    if name.endswith('(%)'):
+        return 'decimal'
+    if '销售额' in name or '运费' in name:
+        return 'money'
+    if '销量' in name or pd.api.types.is_integer_dtype(values):
+        return 'integer'
+    return 'decimal'
+
+
+def write_excel_sheets(output_path, sheets):
+    """
+    将多个DataFrame写入同一个Excel文件
+    
+    Parameters:
+    -----------
+    output_path : str, Path 或 BytesIO
+        输出文件路径或字节流
+    sheets : dict
+        sheet名称 -> DataFrame，不写入索引（需要时先reset_index）
+    """
+    if FastExcel is not None:
+        book = FastExcel(output_path).format(float_format='0.00')
+        for sheet_name, df in sheets.items():
+            # 非默认索引（如排序后的行号）会被当作一列写出，先丢弃
+            book.sheet(sheet_name, df.reset_index(drop=True))
+        book.save()
+    else:
+        # 未安装rustpy-xlsxwriter时回退到xlsxwriter
+        with pd.ExcelWriter(output_path, engine='xlsxwriter') as writer:
+            # 数字格式只在工作簿上注册一次，按整列应用，不逐个单元格设置
+            formats = {key: writer.book.add_format({'num_format': fmt})
+                       for key, fmt in _EXCEL_NUM_FORMATS.items()}
+            for sheet_name, df in sheets.items():
+                df.to_excel(writer, sheet_name=sheet_name, index=False)
+                worksheet = writer.sheets[sheet_name]
+                for i, col in enumerate(df.columns):
+                    key = _excel_format_key(col, df[col])
+                    if key is not None:
+                        worksheet.set_column(i, i, 14, formats[key])
+
 
 class ShopAnalyzer:
     """店铺业绩分析器"""
     
+    # 常见的中文列名映射
+    COLUMN_KEYWORDS = {
+        'product': ['产品', '品名', '商品', '货品', '名称', 'product', 'item'],
+        'size': ['尺寸', '规格', 'size', '规格尺寸'],
+        'quantity': ['数量', '件数', '销量', 'quantity', 'qty', '数量(件)'],
+        'amount': ['金额', '销售额', '收入', 'amount', 'sales', '金额(元)', '销售额(元)'],
+        'shipping': ['运费', '邮费', '快递费', 'shipping', '运费(元)'],
+        'date': ['日期', '时间', 'date', '时间', '月份', 'month']
+    }
+    
+    # 每类关键词预编译为一个正则（不区分大小写）
+    _PATTERNS = {
+        key: re.compile('|'.join(map(re.escape, words)), re.IGNORECASE)
+        for key, words in COLUMN_KEYWORDS.items()
+    }
+    
     def __init__(self, excel_path=None, df=None):
         """
         初始化分析器
@@ -36,12 +212,32 @@ class ShopAnalyzer:
             self.load_data()
         else:
             raise ValueError("必须提供excel_path或df参数")
+        
+        # 列名映射与分析结果只计算一次
+        self._col_map = self.detect_columns()
+        self._perf_cache = {}
+        self._cache_lock = threading.Lock()
+        self._normalize_numeric_columns()
+    
+    def _normalize_numeric_columns(self):
+        """统计列转为数值类型（无法识别的值记为缺失），整数销量压缩为最小整数类型"""
+        for key in ('amount', 'quantity', 'shipping'):
+            col = self._col_map.get(key)
+            if col is None:
+                continue
+            # 统一转为numpy的float64：Arrow类型的列强制转换后，无法识别的值是NaN
+            # 而不是缺失值，求和时不会被跳过，整组结果都会变成NaN
+            values = pd.to_numeric(self.df[col], errors='coerce').astype('float64')
+            if key == 'quantity':
+                # 分组求和时整数会自动提升为int64累加，不会溢出
+                values = pd.to_numeric(values, downcast='integer')
+            self.df[col] = values
     
     def load_data(self):
         """加载Excel数据"""
         try:
             # 尝试读取第一个sheet
-            self.df = pd.read_excel(self.excel_path, sheet_name=0)
+            self.df = self.read_excel_columns(self.excel_path, sheet_name=0)
             print(f"✓ 成功加载数据，共 {len(self.df)} 行")
             print(f"✓ 列名: {list(self.df.columns)}")
         except Exception as e:
@@ -49,30 +245,59 @@ class ShopAnalyzer:
             sys.exit(1)
     
     def detect_columns(self):
-        """自动检测列名（产品、尺寸、数量、金额、运费等）"""
-        columns = self.df.columns.tolist()
-        col_mapping = {}
-        
-        # 常见的中文列名映射
-        keywords = {
-            'product': ['产品', '品名', '商品', '货品', '名称', 'product', 'item'],
-            'size': ['尺寸', '规格', 'size', '规格尺寸'],
-            'quantity': ['数量', '件数', '销量', 'quantity', 'qty', '数量(件)'],
-            'amount': ['金额', '销售额', '收入', 'amount', 'sales', '金额(元)', '销售额(元)'],
-            'shipping': ['运费', '邮费', '快递费', 'shipping', '运费(元)'],
-            'date': ['日期', '时间', 'date', '时间', '月份', 'month']
-        }
-        
-        for col in columns:
-            col_lower = str(col).lower()
-            for key, words in keywords.items():
-                if any(word in str(col) for word in words):
-                    if key not in col_mapping:
-                        col_mapping[key] = col
-                    break
+        """自动检测列名（产品、尺寸、数量、金额、运费等），初始化后直接返回已识别的结果"""
+        col_map = getattr(self, '_col_map', None)
+        if col_map is None:
+            col_map = self.match_columns(self.df.columns)
+        return dict(col_map)
+    
+    @classmethod
+    def match_columns(cls, columns):
+        """
+        按关键词匹配列名
         
+        Returns:
+        --------
+        dict : 类别（product、size等） -> 列名，按列的先后顺序
+        """
+        columns = pd.Index(columns)
+        names = pd.Index(columns.astype(str))
+        found = []
+        claimed = np.zeros(len(names), dtype=bool)
+        
+        for key, pattern in cls._PATTERNS.items():
+            matched = np.asarray(names.str.contains(pattern), dtype=bool)
+            # 每列只归入它匹配到的第一个类别
+            candidates = matched & ~claimed
+            if candidates.any():
+                found.append((candidates.argmax(), key))
+            claimed |= matched
+        
+        # 按列的先后顺序返回
+        col_mapping = {key: columns[i] for i, key in sorted(found)}
         return col_mapping
     
+    @classmethod
+    def read_excel_columns(cls, source, **kwargs):
+        """
+        只读取分析用到的列
+        
+        usecols逐个判断列名是否匹配任一类别的关键词，一次读取即可丢弃
+        宽表中无关的列；一列都匹配不到时读取全部列，便于提示实际列名
+        """
+        df = read_excel(source, usecols=cls._is_analysis_column, **kwargs)
+        if len(df.columns) == 0:
+            if hasattr(source, 'seek'):
+                source.seek(0)
+            df = read_excel(source, **kwargs)
+        return df
+    
+    @classmethod
+    def _is_analysis_column(cls, name):
+        """列名是否匹配任一类别的关键词"""
+        name = str(name)
+        return any(pattern.search(name) for pattern in cls._PATTERNS.values())
+    
     def analyze_product_performance(self, group_by='product'):
         """
         分析产品业绩
@@ -82,25 +307,17 @@ class ShopAnalyzer:
         group_by : str
             分组字段，可以是 'product', 'product_size' 等
         """
-        col_map = self.detect_columns()
+        with self._cache_lock:
+            if group_by in self._perf_cache:
+                return self._perf_cache[group_by]
+        
+        col_map = self._col_map
         
         if not col_map:
-            print("⚠ 无法自动识别列名，请手动指定列名")
-            print(f"当前列名: {list(self.df.columns)}")
+            self._warn_unknown_columns()
             return None
         
-        # 确定分组字段
-        if group_by == 'product':
-            group_col = col_map.get('product')
-        elif group_by == 'product_size':
-            if 'product' in col_map and 'size' in col_map:
-                self.df['产品_尺寸'] = self.df[col_map['product']].astype(str) + '_' + self.df[col_map['size']].astype(str)
-                group_col = '产品_尺寸'
-            else:
-                group_col = col_map.get('product')
-        else:
-            group_col = group_by
-        
+        group_col = self._prepare_group_column(group_by)
         if not group_col:
             print("⚠ 无法找到分组列")
             return None
@@ -110,34 +327,31 @@ class ShopAnalyzer:
         quantity_col = col_map.get('quantity')
         shipping_col = col_map.get('shipping')
         
-        # 构建统计字典
-        agg_dict = {}
+        # 构建命名聚合（输出列名 -> (源列, 聚合方式)）
+        named_aggs = {}
         if amount_col:
-            agg_dict['销售额'] = amount_col
+            named_aggs['销售额'] = (amount_col, 'sum')
         if quantity_col:
-            agg_dict['销量'] = quantity_col
+            named_aggs['销量'] = (quantity_col, 'sum')
         if shipping_col:
-            agg_dict['运费'] = shipping_col
+            named_aggs['运费'] = (shipping_col, 'sum')
         
-        if not agg_dict:
+        if not named_aggs:
             print("⚠ 无法找到统计列（金额、数量、运费）")
             return None
         
-        # 执行分组统计
-        result = self.df.groupby(group_col).agg({
-            col: 'sum' if col in self.df.select_dtypes(include=[np.number]).columns else 'sum'
-            for col in agg_dict.values()
-        }).round(2)
+        # 执行分组统计（一次遍历完成所有列的汇总，输出列直接命名）
+        result = self.df.groupby(group_col, observed=True, sort=False, as_index=True).agg(**named_aggs)
+        # 结果索引还原为原始类型，便于对比和导出
+        result.index = result.index.astype(result.index.categories.dtype)
         
-        # 重命名列
-        rename_dict = {v: k for k, v in agg_dict.items()}
-        result = result.rename(columns=rename_dict)
-        
-        # 计算占比
+        # 计算占比（不做四舍五入，显示时再格式化）
         if '销售额' in result.columns:
-            result['销售额占比(%)'] = (result['销售额'] / result['销售额'].sum() * 100).round(2)
+            sales = result['销售额'].to_numpy()
+            result['销售额占比(%)'] = sales / sales.sum() * 100
         if '销量' in result.columns:
-            result['销量占比(%)'] = (result['销量'] / result['销量'].sum() * 100).round(2)
+            qty = result['销量'].to_numpy()
+            result['销量占比(%)'] = qty / qty.sum() * 100
         
         # 排序
         if '销售额' in result.columns:
@@ -145,51 +359,104 @@ class ShopAnalyzer:
         elif '销量' in result.columns:
             result = result.sort_values('销量', ascending=False)
         
-        return result
+        with self._cache_lock:
+            return self._perf_cache.setdefault(group_by, result)
+    
+    def _warn_unknown_columns(self):
+        """提示无法识别列名"""
+        print("⚠ 无法自动识别列名，请手动指定列名")
+        print(f"当前列名: {list(self.df.columns)}")
+    
+    def _prepare_group_column(self, group_by):
+        """
+        确定分组列，必要时生成组合键并转为类别类型
+        
+        会修改self.df，多线程分析前需先在主线程中调用
+        """
+        col_map = self._col_map
+        if group_by == 'product':
+            group_col = col_map.get('product')
+        elif group_by == 'product_size':
+            if 'product' in col_map and 'size' in col_map:
+                if '产品_尺寸' not in self.df.columns:
+                    self.df['产品_尺寸'] = _join_keys(self.df[col_map['product']], self.df[col_map['size']])
+                group_col = '产品_尺寸'
+            else:
+                group_col = col_map.get('product')
+        else:
+            group_col = group_by
+        
+        # 分组列转为类别类型，groupby按整数编码而不是逐个字符串哈希
+        if group_col and group_col in self.df.columns \
+                and not isinstance(self.df[group_col].dtype, pd.CategoricalDtype):
+            self.df[group_col] = self.df[group_col].astype('category')
+        return group_col
+    
+    def analyze_many(self, group_bys=('product', 'product_size')):
+        """
+        并行计算多个分组维度的业绩
+        
+        pandas的分组汇总在C层释放GIL，各维度可在线程中同时计算；
+        对数据的修改（组合键、类别转换）先在当前线程完成，线程内只读
+        
+        Returns:
+        --------
+        dict : 分组维度 -> 业绩结果
+        """
+        if not self._col_map:
+            # 在当前线程提示一次，避免各线程同时打印
+            self._warn_unknown_columns()
+            return dict.fromkeys(group_bys)
+        
+        with self._cache_lock:
+            results = {g: self._perf_cache[g] for g in group_bys if g in self._perf_cache}
+        missing = [g for g in dict.fromkeys(group_bys) if g not in results]
+        
+        # 只有一个维度需要计算时不必启动线程池
+        if len(missing) == 1:
+            results[missing[0]] = self.analyze_product_performance(missing[0])
+        elif missing:
+            for group_by in missing:
+                self._prepare_group_column(group_by)
+            with ThreadPoolExecutor(max_workers=len(missing)) as executor:
+                futures = {g: executor.submit(self.analyze_product_performance, g) for g in missing}
+                results.update((g, f.result()) for g, f in futures.items())
+        return {g: results[g] for g in group_bys}
     
-    def compare_months(self, month1_df, month2_df, group_by='product'):
+    def compare_months(self, other_analyzer, group_by='product'):
         """
-        对比两个月份的业绩变化
+        对比两个月份的业绩变化（本分析器为上月，other_analyzer为本月）
         
         Parameters:
         -----------
-        month1_df : pd.DataFrame
-            第一个月的数据
-        month2_df : pd.DataFrame
-            第二个月的数据
+        other_analyzer : ShopAnalyzer
+            本月数据的分析器，直接复用其列名映射和已缓存的分析结果
         group_by : str
             分组字段
         """
-        # 创建两个分析器实例
-        analyzer1 = ShopAnalyzer.__new__(ShopAnalyzer)
-        analyzer1.df = month1_df
-        analyzer2 = ShopAnalyzer.__new__(ShopAnalyzer)
-        analyzer2.df = month2_df
-        
-        # 分析两个月的业绩
-        result1 = analyzer1.analyze_product_performance(group_by)
-        result2 = analyzer2.analyze_product_performance(group_by)
+        result1 = self.analyze_product_performance(group_by)
+        result2 = other_analyzer.analyze_product_performance(group_by)
         
         if result1 is None or result2 is None:
             return None
         
-        # 合并数据
-        comparison = pd.DataFrame()
-        comparison['产品'] = result1.index
+        # 本月结果按上月产品对齐，只做一次索引对齐
+        aligned2 = result2.reindex(result1.index, fill_value=0)
+        metrics = [m for m in ('销售额', '销量') if m in result1.columns and m in result2.columns]
         
-        # 合并销售额
-        if '销售额' in result1.columns and '销售额' in result2.columns:
-            comparison['上月销售额'] = result1['销售额']
-            comparison['本月销售额'] = result2.reindex(result1.index, fill_value=0)['销售额']
-            comparison['销售额变化'] = comparison['本月销售额'] - comparison['上月销售额']
-            comparison['销售额变化率(%)'] = ((comparison['销售额变化'] / comparison['上月销售额'].replace(0, np.nan)) * 100).round(2)
+        # 所有数值列放在一个按列连续的二维数组中，每个指标占4列，原地计算
+        out = np.empty((len(result1), 4 * len(metrics)), dtype=np.float64, order='F')
+        names = []
+        for k, metric in enumerate(metrics):
+            prev, curr, change, rate = (out[:, 4 * k + j] for j in range(4))
+            prev[:] = result1[metric].to_numpy(dtype=np.float64)
+            curr[:] = aligned2[metric].to_numpy(dtype=np.float64)
+            _change_and_rate(prev, curr, change, rate)
+            names += [f'上月{metric}', f'本月{metric}', f'{metric}变化', f'{metric}变化率(%)']
         
-        # 合并销量
-        if '销量' in result1.columns and '销量' in result2.columns:
-            comparison['上月销量'] = result1['销量']
-            comparison['本月销量'] = result2.reindex(result1.index, fill_value=0)['销量']
-            comparison['销量变化'] = comparison['本月销量'] - comparison['上月销量']
-            comparison['销量变化率(%)'] = ((comparison['销量变化'] / comparison['上月销量'].replace(0, np.nan)) * 100).round(2)
+        # 直接由数组构建，避免逐列分配和隐式索引对齐
+        comparison = pd.DataFrame(out, columns=names, copy=False)
+        comparison.insert(0, '产品', result1.index.to_numpy())
         
         # 排序
         if '销售额变化' in comparison.columns:
@@ -220,7 +487,7 @@ class ShopAnalyzer:
         report_lines.append("-" * 60)
         product_perf = self.analyze_product_performance('product')
         if product_perf is not None:
-            report_lines.append(product_perf.to_string())
+            report_lines.append(product_perf.to_string(float_format=_format_number))
         report_lines.append("")
         
         # 产品+尺寸业绩分析
@@ -228,7 +495,7 @@ class ShopAnalyzer:
         report_lines.append("-" * 60)
         product_size_perf = self.analyze_product_performance('product_size')
         if product_size_perf is not None:
-            report_lines.append(product_size_perf.head(20).to_string())
+            report_lines.append(product_size_perf.head(20).to_string(float_format=_format_number))
         report_lines.append("")
         
         report_text = "\n".join(report_lines)
@@ -258,17 +525,20 @@ class ShopAnalyzer:
             else:
                 output_path = Path.cwd() / f"分析结果_{timestamp}.xlsx"
         
-        with pd.ExcelWriter(output_path, engine='openpyxl') as writer:
-            # 产品业绩
-            product_perf = self.analyze_product_performance('product')
-            if product_perf is not None:
-                product_perf.to_excel(writer, sheet_name='产品业绩', index=True)
-            
-            # 产品+尺寸业绩
-            product_size_perf = self.analyze_product_performance('product_size')
-            if product_size_perf is not None:
-                product_size_perf.to_excel(writer, sheet_name='产品尺寸业绩', index=True)
+        sheets = {}
+        results = self.analyze_many(('product', 'product_size'))
+        
+        # 产品业绩
+        product_perf = results['product']
+        if product_perf is not None:
+            sheets['产品业绩'] = product_perf.reset_index()
+        
+        # 产品+尺寸业绩
+        product_size_perf = results['product_size']
+        if product_size_perf is not None:
+            sheets['产品尺寸业绩'] = product_size_perf.reset_index()
         
+        write_excel_sheets(output_path, sheets)
         print(f"✓ 分析结果已导出到: {output_path}")
         return output_path
 
@@ -288,23 +558,21 @@ def main():
     
     if args.compare:
         # 对比模式
-        df1 = pd.read_excel(args.compare[0])
-        df2 = pd.read_excel(args.compare[1])
+        df1 = ShopAnalyzer.read_excel_columns(args.compare[0])
+        df2 = ShopAnalyzer.read_excel_columns(args.compare[1])
         
-        analyzer1 = ShopAnalyzer.__new__(ShopAnalyzer)
-        analyzer1.df = df1
-        analyzer2 = ShopAnalyzer.__new__(ShopAnalyzer)
-        analyzer2.df = df2
+        analyzer1 = ShopAnalyzer(df=df1)
+        analyzer2 = ShopAnalyzer(df=df2)
         
-        comparison = analyzer1.compare_months(df1, df2)
+        comparison = analyzer1.compare_months(analyzer2)
         
         if comparison is not None:
             print("\n【月度对比分析】")
             print("=" * 60)
-            print(comparison.to_string(index=False))
+            print(comparison.to_string(index=False, float_format=_format_number))
             
             if args.output:
-                comparison.to_excel(args.output, index=False)
+                write_excel_sheets(args.output, {'月度对比': comparison})
                 print(f"\n✓ 对比结果已保存到: {args.output}")
     else:
         # 单文件分析模式
@@ -0,0 +1,83 @@
+"""
+Web应用冒烟测试：用streamlit AppTest上传Excel文件，走通单文件分析和月度对比分析
+"""
+
+from io import BytesIO
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+from streamlit.testing.v1 import AppTest
+
+APP_PATH = str(Path(__file__).resolve().parent.parent / 'app.py')
+XLSX_MIME = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+
+
+def _sample_xlsx(seed, rows=120):
+    """生成一份示例订单Excel的字节内容"""
+    rng = np.random.default_rng(seed)
+    df = pd.DataFrame({
+        '产品名称': rng.choice(['T恤', '衬衫', '裤子', '外套', '帽子'], size=rows),
+        '尺寸': rng.choice(['S', 'M', 'L', 'XL'], size=rows),
+        '数量': rng.integers(1, 5, size=rows),
+        '金额(元)': rng.uniform(20, 300, size=rows).round(2),
+        '运费': rng.uniform(0, 15, size=rows).round(2),
+    })
+    buffer = BytesIO()
+    df.to_excel(buffer, index=False)
+    return buffer.getvalue()
+
+
+def _mixed_type_xlsx():
+    """数值列中混有文字的Excel（运费写"包邮"、数量写"-"）"""
+    df = pd.DataFrame({
+        '产品名称': ['T恤', '衬衫', '裤子', 'T恤'],
+        '数量': [2, '-', 1, 3],
+        '金额(元)': [99.0, 158.5, 129.0, 149.0],
+        '运费': [6, '包邮', 8, 0],
+    })
+    buffer = BytesIO()
+    df.to_excel(buffer, index=False)
+    return buffer.getvalue()
+
+
+def _generate_and_download(at):
+    """点击生成Excel报告，确认出现下载按钮"""
+    build = [b for b in at.button if b.label.endswith('生成Excel报告')]
+    assert len(build) == 1
+    build[0].click().run()
+    assert not at.exception
+    assert len(at.get('download_button')) == 1
+
+
+def test_single_file_analysis():
+    at = AppTest.from_file(APP_PATH, default_timeout=120).run()
+    at.file_uploader[0].set_value(('本月.xlsx', _sample_xlsx(1), XLSX_MIME)).run()
+    
+    assert not at.exception
+    assert any('成功加载数据' in s.value for s in at.success)
+    assert len(at.metric) > 0
+    _generate_and_download(at)
+
+
+def test_month_comparison():
+    at = AppTest.from_file(APP_PATH, default_timeout=120).run()
+    at.sidebar.radio[0].set_value('月度对比分析').run()
+    at.file_uploader(key='month1').set_value(('上月.xlsx', _sample_xlsx(1), XLSX_MIME))
+    at.file_uploader(key='month2').set_value(('本月.xlsx', _sample_xlsx(2, rows=90), XLSX_MIME))
+    at.run()
+    
+    assert not at.exception
+    assert any('上月数据: 120 行 | 本月数据: 90 行' in s.value for s in at.success)
+    assert len(at.metric) > 0
+    _generate_and_download(at)
+
+
+def test_upload_with_text_in_numeric_columns():
+    at = AppTest.from_file(APP_PATH, default_timeout=120).run()
+    at.file_uploader[0].set_value(('混合类型.xlsx', _mixed_type_xlsx(), XLSX_MIME)).run()
+    
+    assert not at.exception
+    assert not at.error
+    assert any('成功加载数据，共 4 行' in s.value for s in at.success)
+    assert len(at.metric) > 0
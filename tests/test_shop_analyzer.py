@@ -0,0 +1,166 @@
+"""
+分析模块单元测试
+"""
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import shop_analyzer
+from shop_analyzer import ShopAnalyzer, _join_keys, write_excel_sheets
+
+
+def test_match_columns_english_headers_ignore_case():
+    columns = ['Product Name', 'SIZE', 'QTY', 'Sales Amount', 'Shipping Fee', 'Order Date']
+    assert ShopAnalyzer.match_columns(columns) == {
+        'product': 'Product Name',
+        'size': 'SIZE',
+        'quantity': 'QTY',
+        'amount': 'Sales Amount',
+        'shipping': 'Shipping Fee',
+        'date': 'Order Date',
+    }
+
+
+def test_match_columns_first_matching_category_wins():
+    # "Sales Qty"同时匹配数量（qty）和金额（sales），归入先定义的数量类别
+    assert ShopAnalyzer.match_columns(['Sales Qty']) == {'quantity': 'Sales Qty'}
+    # "产品规格"归入产品，尺寸类别由后面的"规格"列匹配
+    assert ShopAnalyzer.match_columns(['产品规格', '规格', '数量']) == {
+        'product': '产品规格',
+        'size': '规格',
+        'quantity': '数量',
+    }
+
+
+def test_match_columns_takes_first_matching_column():
+    assert ShopAnalyzer.match_columns(['产品ID', '产品名称', '金额'])['product'] == '产品ID'
+
+
+def test_match_columns_keeps_column_order():
+    col_map = ShopAnalyzer.match_columns(['运费', '金额', '产品'])
+    assert list(col_map) == ['shipping', 'amount', 'product']
+
+
+def _assert_joined(keys):
+    assert isinstance(keys, pd.Categorical)
+    assert list(keys) == ['T恤_M', 'T恤_L', '裤子_32', 'T恤_M']
+    assert list(keys.categories) == ['T恤_M', 'T恤_L', '裤子_32']
+
+
+def test_join_keys():
+    left = pd.Series(['T恤', 'T恤', '裤子', 'T恤'])
+    right = pd.Series(['M', 'L', 32, 'M'], dtype=object)
+    _assert_joined(_join_keys(left, right))
+
+
+def test_join_keys_without_pyarrow(monkeypatch):
+    monkeypatch.setattr(shop_analyzer, 'pa', None)
+    left = pd.Series(['T恤', 'T恤', '裤子', 'T恤'])
+    right = pd.Series(['M', 'L', 32, 'M'], dtype=object)
+    _assert_joined(_join_keys(left, right))
+
+
+def _month_analyzer(rows):
+    return ShopAnalyzer(df=pd.DataFrame(rows, columns=['产品', '数量', '金额']))
+
+
+def _compare_sample():
+    last_month = _month_analyzer([
+        ('T恤', 2, 100.0), ('衬衫', 0, 0.0), ('外套', 1, 50.0),
+    ])
+    this_month = _month_analyzer([
+        ('T恤', 1, 60.0), ('T恤', 2, 90.0), ('衬衫', 2, 80.0), ('帽子', 1, 30.0),
+    ])
+    return last_month.compare_months(this_month).set_index('产品')
+
+
+def test_compare_months_aligns_products_in_both_months():
+    comparison = _compare_sample()
+    month_columns = ['上月销售额', '本月销售额', '上月销量', '本月销量']
+    assert not comparison[month_columns].isna().any().any()
+    
+    row = comparison.loc['T恤']
+    assert row['上月销售额'] == 100.0
+    assert row['本月销售额'] == 150.0
+    assert row['销售额变化'] == 50.0
+    assert row['销售额变化率(%)'] == 50.0
+    assert row['上月销量'] == 2
+    assert row['本月销量'] == 3
+
+
+def test_compare_months_zero_base_rate_is_not_finite():
+    row = _compare_sample().loc['衬衫']
+    assert row['销售额变化'] == 80.0
+    assert not np.isfinite(row['销售额变化率(%)'])
+    assert not np.isfinite(row['销量变化率(%)'])
+
+
+def test_compare_months_missing_product_counts_as_zero():
+    row = _compare_sample().loc['外套']
+    assert row['本月销售额'] == 0
+    assert row['本月销量'] == 0
+    assert row['销售额变化'] == -50.0
+    assert row['销售额变化率(%)'] == -100.0
+
+
+def test_bad_amount_cell_in_arrow_column_is_skipped():
+    pa = pytest.importorskip('pyarrow')
+    df = pd.DataFrame({
+        '产品': pd.Series(['T恤', 'T恤', '裤子'], dtype=pd.ArrowDtype(pa.string())),
+        '数量': pd.Series([1, 2, 3], dtype=pd.ArrowDtype(pa.int64())),
+        # 读入时金额列混有文字，整列为Arrow字符串类型
+        '金额': pd.Series(['1.5', '未付款', '2.25'], dtype=pd.ArrowDtype(pa.string())),
+    })
+    result = ShopAnalyzer(df=df).analyze_product_performance('product')
+    
+    assert result.loc['T恤', '销售额'] == 1.5
+    assert result.loc['裤子', '销售额'] == 2.25
+    assert np.isfinite(result['销售额占比(%)']).all()
+    assert result['销售额占比(%)'].sum() == pytest.approx(100.0)
+
+
+def test_xlsxwriter_fallback_applies_column_formats(tmp_path, monkeypatch):
+    openpyxl = pytest.importorskip('openpyxl')
+    pytest.importorskip('xlsxwriter')
+    monkeypatch.setattr(shop_analyzer, 'FastExcel', None)
+    
+    df = pd.DataFrame({
+        '产品': ['T恤', '裤子'],
+        '销售额': [1234.5, 99.0],
+        '销量': [3, 1],
+        '运费': [6.0, 0.0],
+        '销售额占比(%)': [92.57, 7.43],
+        '单价': [411.5, 99.0],
+    })
+    path = tmp_path / 'report.xlsx'
+    write_excel_sheets(path, {'产品业绩': df})
+    
+    sheet = openpyxl.load_workbook(path)['产品业绩']
+    assert [cell.value for cell in sheet[1]] == list(df.columns)
+    formats = {header.value: cell.number_format for header, cell in zip(sheet[1], sheet[2])}
+    assert formats == {
+        '产品': 'General',
+        '销售额': '¥#,##0.00',
+        '销量': '#,##0',
+        '运费': '¥#,##0.00',
+        '销售额占比(%)': '0.00',
+        '单价': '0.00',
+    }
+    # 写入原值，格式只影响显示
+    assert sheet['B2'].value == 1234.5
+
+
+def test_read_excel_columns_keeps_only_analysis_columns(tmp_path):
+    path = tmp_path / 'orders.xlsx'
+    pd.DataFrame({
+        '订单号': [1, 2], '产品名称': ['T恤', '裤子'], '备注': ['', '加急'],
+        '数量': [1, 2], '金额(元)': [99.0, 258.0],
+    }).to_excel(path, index=False)
+    assert ShopAnalyzer.read_excel_columns(path).columns.tolist() == ['产品名称', '数量', '金额(元)']
+
+
+def test_read_excel_columns_reads_all_when_nothing_matches(tmp_path):
+    path = tmp_path / 'other.xlsx'
+    pd.DataFrame({'a': [1], 'b': [2]}).to_excel(path, index=False)
+    assert ShopAnalyzer.read_excel_columns(path).columns.tolist() == ['a', 'b']